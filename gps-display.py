@@ -4,24 +4,57 @@ import pygame
 import dbus
 import dbus.mainloop.glib
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import io
 import math
 import threading
+import queue
 import time
 import os
-from PIL import Image
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from gi.repository import GLib
 
 # Display dimensions
 WIDTH, HEIGHT = 480, 272
 
+# Zoom limits
+MIN_ZOOM, MAX_ZOOM = 2, 18
+
+DEG2RAD = math.pi / 180.0
+
+def optional_float(value):
+    """Convert a GPSD value to float, mapping NaN (not reported) to None"""
+    result = float(value)
+    return None if math.isnan(result) else result
+
+class LRUCache(OrderedDict):
+    """Dictionary holding at most max_size entries, evicting the least recently used"""
+    def __init__(self, max_size):
+        super().__init__()
+        self.max_size = max_size
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.max_size:
+            self.popitem(last=False)
+    
+    def get(self, key, default=None):
+        """Return the value for key, marking it recently used"""
+        if key in self:
+            self.move_to_end(key)
+            return self[key]
+        return default
+
 class GPSMapDisplay:
     def __init__(self):
         # Initialize PyGame
         pygame.init()
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption("GPS Map Display")
-        self.clock = pygame.time.Clock()
         
         # Load fonts
         self.font_small = pygame.font.SysFont('Arial', 12)
@@ -32,22 +65,71 @@ class GPSMapDisplay:
         self.map_center = (-0.787166, 51.617864)  # Default center
         self.zoom = 16
         self.tile_size = 256
-        self.tiles = {}  # Dictionary to store multiple tiles: {(x, y): tile_surface}
+        
+        # Per-zoom constants, indexed by zoom level
+        self.zoom_tiles = [1 << z for z in range(MAX_ZOOM + 1)]  # tiles per axis
+        self.zoom_tiles_per_deg = [n / 360.0 for n in self.zoom_tiles]
+        self.tiles = LRUCache(64)  # Decoded tiles (~16 MB): {(zoom, x, y): tile_surface}
+        self.tiles_lock = threading.Lock()  # Guards self.tiles, self.failed_tiles and self.tile_downloads
+        self.tile_downloads = {}  # In-flight downloads: {(zoom, x, y): threading.Event}
+        self.fallback_keys = set()  # Cached tiles that are placeholders, retried on reload
         self.current_tile_coords = None  # Center tile coordinates
+        self.tile_generation = 0  # Bumped on every reload to cancel stale prefetches
+        self.dirty = True  # Set when the map needs a full repaint
+        self.map_offset_key = None  # (map_center, tile_coords) of map_offset
+        self.map_offset = (0, 0)  # Screen position of the center tile
+        
+        # The 3x3 tiles around the center tile always cover the screen, so
+        # they are composed into one surface that is blitted each frame
+        self.map_mosaic = pygame.Surface((3 * self.tile_size, 3 * self.tile_size)).convert()
+        self.mosaic_coords = None  # Center tile coordinates of the mosaic
+        self.mosaic_stale = True  # Set when a tile arrives
+        self.mosaic_tile_count = 0  # Real (non-fallback) tiles in the mosaic
+        self.status_bar_texts = None  # Texts last drawn in the status bar
+        self.next_gps_log_time = 0.0  # time.monotonic() deadline for the next position log
+        self.gps_tile = None  # Tile of the last fix: (x, y, zoom)
         
         # Calculate how many tiles we need to cover the display
         self.tiles_x = math.ceil(WIDTH / self.tile_size) + 2  # +2 for buffer
         self.tiles_y = math.ceil(HEIGHT / self.tile_size) + 2  # +2 for buffer
         
-        # Tile cache setup
+        # Tile cache setup (tiles left in the old flat tile_{zoom}_{x}_{y}.png
+        # layout are never loaded, and are the first evicted from the disk cache)
         self.cache_dir = "map_cache"
         os.makedirs(self.cache_dir, exist_ok=True)
         
+        # Bound the disk cache, evicting least recently used tiles first
+        self.disk_cache_max_bytes = 200 * 1024 * 1024
+        self.disk_cache = OrderedDict()  # Cached tile files: {filename: size}
+        self.disk_cache_bytes = 0
+        self.disk_cache_lock = threading.Lock()
+        self.scan_disk_cache()
+        
         # Tile download settings
         self.edge_buffer_percent = 0.20  # 20% buffer for smoother panning
         self.edge_buffer_pixels = int(self.tile_size * self.edge_buffer_percent)
-        self.last_tile_download_time = 0
+        self.last_tile_download_time = float('-inf')  # time.monotonic() of the last reload
         self.download_cooldown = 1.0  # seconds between tile downloads
+        self.download_workers = 2  # parallel downloads, kept low per OSM tile usage policy
+        self.download_slots = threading.BoundedSemaphore(self.download_workers)  # Shared by all download paths
+        self.failed_tiles = LRUCache(256)  # Failed downloads: {(zoom, x, y): monotonic retry_time}
+        self.failed_tile_ttl = 300  # seconds before retrying a tile the server refused (HTTP 4xx)
+        self.error_tile_ttl = 30  # seconds before retrying after a network or server error
+        
+        # PNG decoding is CPU bound, so use one worker per core
+        self.decode_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        
+        # Shared HTTP session so TCP/TLS connections are kept alive across tiles
+        self.http = requests.Session()
+        retries = Retry(total=2, backoff_factor=0.2,
+                        status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries)
+        self.http.mount("https://", adapter)
+        
+        # Add headers to be polite to OSM servers
+        self.http.headers.update({
+            'User-Agent': 'i.MX6-GPS-Display/1.0 (embedded navigation system)'
+        })
         
         # Colors
         self.colors = {
@@ -59,8 +141,36 @@ class GPSMapDisplay:
             'status_warn': (200, 200, 50),
         }
         
+        # Pre-rendered overlays
+        self.info_panel_bg = pygame.Surface((150, 80), pygame.SRCALPHA)
+        self.info_panel_bg.fill((0, 0, 0, 127))
+        self.info_panel_bg = self.info_panel_bg.convert_alpha()
+        self.marker = self.create_marker()
+        self.text_cache = LRUCache(32)  # Rendered text: {(text, font, color): surface}
+        self.fallback_font = pygame.font.SysFont('Arial', 12)
+        self.fallback_base = self.create_fallback_base()
+        self.fallback_tiles = LRUCache(32)  # Fallback tiles: {(x, y): tile_surface}
+        
+        # Status bar is opaque: idle frames redraw it over itself, so any
+        # translucency would darken with each redraw
+        self.status_bar_bg = pygame.Surface((WIDTH, 20)).convert()
+        self.status_bar_bg.fill((0, 0, 0))
+        
+        # Start tile prefetcher for the ring just outside the display
+        self.prefetch_q = queue.Queue(maxsize=32)
+        self.prefetch_pending = {}  # Queued prefetches: {(zoom, x, y): generation}
+        self.prefetch_thread = threading.Thread(target=self._prefetch_worker)
+        self.prefetch_thread.daemon = True
+        self.prefetch_thread.start()
+        
+        # Start tile loader, woken by request_map_tiles()
+        self.tile_request_q = queue.Queue(maxsize=1)
+        self.tile_loader_thread = threading.Thread(target=self._tile_loader_worker)
+        self.tile_loader_thread.daemon = True
+        self.tile_loader_thread.start()
+        
         # Load initial map tiles
-        self.load_map_tiles()
+        self.request_map_tiles()
         
         # Start D-Bus listener in separate thread
         self.running = True
@@ -68,49 +178,136 @@ class GPSMapDisplay:
         self.dbus_thread.daemon = True
         self.dbus_thread.start()
         
+    def lon2tile_frac(self, lon, zoom):
+        """Convert longitude to fractional tile position"""
+        return (lon + 180.0) * self.zoom_tiles_per_deg[zoom]
+    
+    def lat2tile_frac(self, lat, zoom):
+        """Convert latitude to fractional tile position"""
+        # asinh(tan(lat)) == log(tan(lat) + sec(lat)), with one less transcendental
+        return (1.0 - math.asinh(math.tan(lat * DEG2RAD)) / math.pi) * 0.5 * self.zoom_tiles[zoom]
+    
     def lon2tile(self, lon, zoom):
         """Convert longitude to tile number"""
-        return int((lon + 180.0) / 360.0 * (2 ** zoom))
+        return int(self.lon2tile_frac(lon, zoom))
     
     def lat2tile(self, lat, zoom):
         """Convert latitude to tile number"""
-        return int((1.0 - math.log(math.tan(lat * math.pi / 180.0) + 
-                  1.0 / math.cos(lat * math.pi / 180.0)) / math.pi) / 
-                  2.0 * (2 ** zoom))
+        return int(self.lat2tile_frac(lat, zoom))
     
-    def tile2lon(self, x, zoom):
-        """Convert tile number to longitude"""
-        return x / (2 ** zoom) * 360.0 - 180.0
+    def get_tile_filename(self, x, y, zoom):
+        """Generate cache filename for tile, sharded as {zoom}/{x}/{y}.png"""
+        return os.path.join(self.cache_dir, str(zoom), str(x), f"{y}.png")
     
-    def tile2lat(self, y, zoom):
-        """Convert tile number to latitude"""
-        n = math.pi - 2.0 * math.pi * y / (2 ** zoom)
-        return 180.0 / math.pi * math.atan(0.5 * (math.exp(n) - math.exp(-n)))
+    def scan_disk_cache(self):
+        """Index the tile files already on disk, oldest first"""
+        files = []
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for name in filenames:
+                filename = os.path.join(dirpath, name)
+                # Clear out temp files left by downloads interrupted mid-write;
+                # this runs before any download starts, so none are in use
+                if name.endswith(".png.tmp"):
+                    try:
+                        os.remove(filename)
+                    except OSError:
+                        pass
+                    continue
+                if not name.endswith(".png"):
+                    continue
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, filename, stat.st_size))
+        
+        files.sort()
+        with self.disk_cache_lock:
+            for _, filename, size in files:
+                self.disk_cache[filename] = size
+                self.disk_cache_bytes += size
+            self.evict_disk_cache()
     
-    def get_tile_filename(self, x, y, zoom):
-        """Generate cache filename for tile"""
-        return os.path.join(self.cache_dir, f"tile_{zoom}_{x}_{y}.png")
+    def evict_disk_cache(self):
+        """Delete least recently used tile files until under the size limit"""
+        while self.disk_cache_bytes > self.disk_cache_max_bytes and self.disk_cache:
+            filename, size = self.disk_cache.popitem(last=False)
+            self.disk_cache_bytes -= size
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            
+            # Prune the {zoom}/{x}/ directories the eviction left empty;
+            # rmdir refuses ones that still hold files
+            dirname = os.path.dirname(filename)
+            while dirname != self.cache_dir:
+                try:
+                    os.rmdir(dirname)
+                except OSError:
+                    break
+                dirname = os.path.dirname(dirname)
+    
+    def touch_disk_cache(self, keys):
+        """Mark the tile files for in-memory tiles as recently used on disk"""
+        with self.disk_cache_lock:
+            for zoom, x, y in keys:
+                filename = self.get_tile_filename(x, y, zoom)
+                if filename in self.disk_cache:
+                    self.disk_cache.move_to_end(filename)
     
     def load_cached_tile(self, x, y, zoom):
-        """Load tile from cache if available"""
+        """Load tile from the disk cache if available"""
         filename = self.get_tile_filename(x, y, zoom)
-        if os.path.exists(filename):
-            try:
-                return pygame.image.load(filename)
-            except:
-                return None
-        return None
+        try:
+            # Just try the load; a separate exists() check costs an extra stat
+            tile = pygame.image.load(filename).convert()
+        except:
+            return None  # Missing or unreadable
+        
+        with self.disk_cache_lock:
+            if filename in self.disk_cache:
+                self.disk_cache.move_to_end(filename)
+        return tile
     
-    def save_tile_to_cache(self, x, y, zoom, tile_data):
-        """Save tile to cache"""
+    def save_tile_to_cache(self, x, y, zoom, png_data):
+        """Save downloaded PNG bytes to cache as-is"""
         filename = self.get_tile_filename(x, y, zoom)
+        temp_filename = None
         try:
-            pygame.image.save(tile_data, filename)
+            # Write to a temporary file first so readers never see a partial tile;
+            # each write gets its own, so concurrent writers can't interleave.
+            # Create it under the lock so eviction can't prune the directory
+            # out from under it.
+            with self.disk_cache_lock:
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(filename),
+                                                     suffix=".png.tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(png_data)
+            os.replace(temp_filename, filename)
         except:
-            pass
+            if temp_filename:
+                try:
+                    os.remove(temp_filename)
+                except OSError:
+                    pass
+            return
+        
+        with self.disk_cache_lock:
+            self.disk_cache_bytes += len(png_data) - self.disk_cache.pop(filename, 0)
+            self.disk_cache[filename] = len(png_data)
+            self.evict_disk_cache()
     
-    def create_fallback_tile(self, x, y):
-        """Create a fallback tile for missing tiles"""
+    def create_marker(self):
+        """Create the blue position marker"""
+        marker = pygame.Surface((17, 17), pygame.SRCALPHA)
+        pygame.draw.circle(marker, self.colors['marker'], (8, 8), 8)
+        pygame.draw.circle(marker, (255, 255, 255), (8, 8), 3)
+        return marker.convert_alpha()
+    
+    def create_fallback_base(self):
+        """Create the grid shared by all fallback tiles"""
         tile = pygame.Surface((self.tile_size, self.tile_size))
         tile.fill((80, 80, 80))
         
@@ -119,42 +316,158 @@ class GPSMapDisplay:
             pygame.draw.line(tile, (120, 120, 120), (i, 0), (i, self.tile_size), 1)
             pygame.draw.line(tile, (120, 120, 120), (0, i), (self.tile_size, i), 1)
         
-        # Add tile coordinates
-        font = pygame.font.SysFont('Arial', 12)
-        text = font.render(f"{x},{y}", True, (180, 180, 180))
+        return tile.convert()
+    
+    def create_fallback_tile(self, x, y):
+        """Create a fallback tile for missing tiles"""
+        tile = self.fallback_tiles.get((x, y))
+        if tile:
+            return tile
+        
+        # Start from the shared grid and add tile coordinates
+        tile = self.fallback_base.copy()
+        text = self.fallback_font.render(f"{x},{y}", True, (180, 180, 180))
         tile.blit(text, (10, 10))
         
+        self.fallback_tiles[(x, y)] = tile
         return tile
     
-    def download_tile(self, x, y, zoom):
-        """Download a single tile"""
+    def get_loaded_tile(self, key):
+        """Return a real tile from the in-memory cache, or None"""
+        with self.tiles_lock:
+            if key in self.fallback_keys:
+                return None
+            return self.tiles.get(key)
+    
+    def claim_download(self, key):
+        """Mark a tile as downloading, returning the Event of a download already in flight"""
+        with self.tiles_lock:
+            pending = self.tile_downloads.get(key)
+            if pending is None:
+                self.tile_downloads[key] = threading.Event()
+            return pending
+    
+    def release_download(self, key):
+        """Mark a tile download as finished, waking any threads waiting on it"""
+        with self.tiles_lock:
+            done = self.tile_downloads.pop(key, None)
+        if done:
+            done.set()
+    
+    def has_tile(self, key):
+        """Check the in-memory cache for a real tile, marking it recently used"""
+        with self.tiles_lock:
+            if key in self.tiles and key not in self.fallback_keys:
+                self.tiles.move_to_end(key)
+                return True
+        return False
+    
+    def get_entering_tiles(self, tiles, zoom):
+        """Return the tiles not yet in memory, marking the rest recently used"""
+        with self.tiles_lock:
+            loaded = {key for key in self.tiles if key not in self.fallback_keys}
+            wanted = {(zoom, x, y) for x, y in tiles}
+            for key in wanted & loaded:
+                self.tiles.move_to_end(key)
+        
+        # Tiles served from memory are still in use, so keep their files
+        # from aging out of the disk cache in download order
+        self.touch_disk_cache(wanted & loaded)
+        
+        return [(x, y) for _, x, y in wanted - loaded]
+    
+    def store_tile(self, key, tile, fallback=False):
+        """Add a tile to the in-memory cache, evicting the least recently used"""
+        with self.tiles_lock:
+            self.tiles[key] = tile
+            if fallback:
+                self.fallback_keys.add(key)
+            else:
+                self.fallback_keys.discard(key)
+            
+            # Forget placeholders that were evicted
+            self.fallback_keys &= self.tiles.keys()
+        
+        # Only repaint for tiles the mosaic actually shows; prefetched tiles
+        # further out would otherwise force a recompose for nothing
+        mosaic_coords = self.mosaic_coords  # Read once, the main loop replaces it
+        if mosaic_coords is None or self.in_mosaic(key, mosaic_coords):
+            self.mosaic_stale = True
+            self.dirty = True
+    
+    def in_mosaic(self, key, mosaic_coords):
+        """Check if a tile falls in the 3x3 block around the mosaic center"""
+        zoom, x, y = key
+        center_x, center_y, center_zoom = mosaic_coords
+        return zoom == center_zoom and abs(x - center_x) <= 1 and abs(y - center_y) <= 1
+    
+    def is_failed_tile(self, x, y, zoom):
+        """Check if a tile failed to download recently"""
+        with self.tiles_lock:
+            retry_time = self.failed_tiles.get((zoom, x, y))
+            if retry_time is None:
+                return False
+            if time.monotonic() >= retry_time:
+                self.failed_tiles.pop((zoom, x, y), None)
+                return False
+            return True
+    
+    def download_tile(self, x, y, zoom, speculative=False):
+        """Download a single tile into the in-memory cache, returning None on failure"""
+        # If the loader and prefetcher want the same tile, only one requests
+        # it; the other waits and takes the stored result, or tries again
+        # itself if that download failed without blacklisting the tile
+        key = (zoom, x, y)
+        while True:
+            pending = self.claim_download(key)
+            if pending is None:
+                break
+            pending.wait()
+            tile = self.get_loaded_tile(key)
+            if tile or self.is_failed_tile(x, y, zoom):
+                return tile
+        
+        try:
+            return self.fetch_tile(x, y, zoom, speculative)
+        finally:
+            self.release_download(key)
+    
+    def fetch_tile(self, x, y, zoom, speculative=False):
+        """Request a single tile, storing it before returning; None on failure"""
+        refused = False  # Set when the server definitively won't serve the tile
         try:
             url = f"https://tile.openstreetmap.org/{zoom}/{x}/{y}.png"
-            
-            # Add headers to be polite to OSM servers
-            headers = {
-                'User-Agent': 'i.MX6-GPS-Display/1.0 (embedded navigation system)'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=10)
+            with self.download_slots:
+                response = self.http.get(url, timeout=(3, 10))
             
             if response.status_code == 200:
-                # Convert to PyGame surface
-                image_data = io.BytesIO(response.content)
-                pil_image = Image.open(image_data)
-                rgb_image = pil_image.convert('RGB')
-                data = rgb_image.tobytes()
-                
-                tile = pygame.image.fromstring(data, rgb_image.size, rgb_image.mode)
-                self.save_tile_to_cache(x, y, zoom, tile)
+                # Decode the PNG straight into a PyGame surface, converted once
+                # to the display format so blits don't have to. BytesIO shares
+                # the bytes buffer rather than copying it, and the same bytes
+                # are written to the cache, so the body is held only once.
+                png_data = response.content
+                tile = pygame.image.load(io.BytesIO(png_data), "tile.png").convert()
+                self.save_tile_to_cache(x, y, zoom, png_data)
+                self.store_tile((zoom, x, y), tile)
                 return tile
             else:
                 print(f"❌ Failed to download tile {x},{y}: HTTP {response.status_code}")
-                return self.create_fallback_tile(x, y)
+                refused = 400 <= response.status_code < 500 and response.status_code != 429
                 
         except Exception as e:
             print(f"❌ Error downloading tile {x},{y}: {e}")
-            return self.create_fallback_tile(x, y)
+        
+        # A timeout or server error during a prefetch may be a one-off, so
+        # leave the tile for the display loader to try itself
+        if speculative and not refused:
+            return None
+        
+        # Don't retry the tile until the TTL expires, backing off for longer
+        # when the server refused it than after a network or server error
+        ttl = self.failed_tile_ttl if refused else self.error_tile_ttl
+        with self.tiles_lock:
+            self.failed_tiles[(zoom, x, y)] = time.monotonic() + ttl
+        return None
     
     def get_tiles_to_load(self, center_x, center_y):
         """Get all tile coordinates needed to fill the display"""
@@ -177,49 +490,167 @@ class GPSMapDisplay:
         
         return tiles_to_load
     
+    def get_prefetch_ring(self, center_x, center_y):
+        """Get tile coordinates one ring outside the display tiles"""
+        tiles_to_load = self.get_tiles_to_load(center_x, center_y)
+        xs = [x for x, _ in tiles_to_load]
+        ys = [y for _, y in tiles_to_load]
+        min_x, max_x = min(xs) - 1, max(xs) + 1
+        min_y, max_y = min(ys) - 1, max(ys) + 1
+        
+        ring = []
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                if x in (min_x, max_x) or y in (min_y, max_y):
+                    ring.append((x, y))
+        
+        return ring
+    
+    def queue_prefetch(self, center_x, center_y, zoom, generation):
+        """Queue the tile ring around the center for background download"""
+        for x, y in self.get_prefetch_ring(center_x, center_y):
+            key = (zoom, x, y)
+            
+            # Tiles already queued just move to the new generation
+            with self.tiles_lock:
+                queued = key in self.prefetch_pending
+                self.prefetch_pending[key] = generation
+            if queued:
+                continue
+            
+            try:
+                self.prefetch_q.put_nowait((x, y, zoom))
+            except queue.Full:
+                with self.tiles_lock:
+                    self.prefetch_pending.pop(key, None)
+                break
+    
+    def _prefetch_worker(self):
+        """Download queued tiles in the background"""
+        while True:
+            x, y, zoom = self.prefetch_q.get()
+            try:
+                key = (zoom, x, y)
+                with self.tiles_lock:
+                    generation = self.prefetch_pending.pop(key, None)
+                
+                # Skip work queued before the last reload
+                if generation != self.tile_generation:
+                    continue
+                
+                if self.has_tile(key) or self.is_failed_tile(x, y, zoom):
+                    continue
+                
+                # Downloaded tiles are stored by download_tile itself
+                tile = self.load_cached_tile(x, y, zoom)
+                if tile:
+                    self.store_tile(key, tile)
+                else:
+                    self.download_tile(x, y, zoom, speculative=True)
+            except Exception as e:
+                print(f"❌ Error prefetching tile {x},{y}: {e}")
+            finally:
+                self.prefetch_q.task_done()
+    
+    def request_map_tiles(self):
+        """Ask the tile loader to load tiles for the current center and zoom"""
+        try:
+            self.tile_request_q.put_nowait(None)
+        except queue.Full:
+            pass  # A load is already pending and will see the latest state
+    
+    def _tile_loader_worker(self):
+        """Load map tiles in the background when requested"""
+        while True:
+            self.tile_request_q.get()
+            
+            # Wait out the download cooldown rather than dropping the request,
+            # on the monotonic clock so a clock step can't stall the loader
+            wait = self.last_tile_download_time + self.download_cooldown - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            
+            self.load_map_tiles()
+    
     def load_map_tiles(self):
         """Load all tiles needed to fill the display"""
         try:
-            current_time = time.time()
+            current_time = time.monotonic()
             
-            # Check download cooldown
-            if current_time - self.last_tile_download_time < self.download_cooldown:
-                return
-                
+            # Snapshot state the GPS and render threads may change meanwhile
             lon, lat = self.map_center
+            zoom = self.zoom
             
             # Calculate center tile coordinates
-            center_x = self.lon2tile(lon, self.zoom)
-            center_y = self.lat2tile(lat, self.zoom)
+            center_x = self.lon2tile(lon, zoom)
+            center_y = self.lat2tile(lat, zoom)
             
             # Check if we need to load new tiles
             if (self.current_tile_coords and 
-                self.current_tile_coords == (center_x, center_y, self.zoom)):
+                self.current_tile_coords == (center_x, center_y, zoom)):
                 return  # Same center tile, no need to reload
                 
-            self.current_tile_coords = (center_x, center_y, self.zoom)
+            self.current_tile_coords = (center_x, center_y, zoom)
             self.last_tile_download_time = current_time
+            self.dirty = True  # Redraw around the new center tile
+            
+            # Cancel any prefetches queued for the previous center
+            with self.tiles_lock:
+                self.tile_generation += 1
+                generation = self.tile_generation
             
-            print(f"🔄 Loading tiles for center: {center_x},{center_y}@{self.zoom}")
+            print(f"🔄 Loading tiles for center: {center_x},{center_y}@{zoom}")
             
             # Get all tiles needed to fill the display
             tiles_to_load = self.get_tiles_to_load(center_x, center_y)
             
-            # Load or download each tile
-            new_tiles = {}
-            for x, y in tiles_to_load:
-                # Try to load from cache first
-                cached_tile = self.load_cached_tile(x, y, self.zoom)
+            # Only load tiles entering the display, decoding from disk in parallel.
+            # Tiles leaving the display age out of the LRU so panning back is free.
+            entering = self.get_entering_tiles(tiles_to_load, zoom)
+            
+            # Tiles that failed recently get a fallback without another attempt
+            needed = []
+            for x, y in entering:
+                if self.is_failed_tile(x, y, zoom):
+                    self.store_tile((zoom, x, y),
+                                    self.create_fallback_tile(x, y), fallback=True)
+                else:
+                    needed.append((x, y))
+            
+            decodes = {
+                self.decode_pool.submit(self.load_cached_tile, x, y, zoom): (x, y)
+                for x, y in needed
+            }
+            
+            # Collect the tiles that aren't cached on disk either
+            missing = []
+            for future in as_completed(decodes):
+                x, y = decodes[future]
+                cached_tile = future.result()
                 if cached_tile:
-                    new_tiles[(x, y)] = cached_tile
+                    self.store_tile((zoom, x, y), cached_tile)
                 else:
-                    # Download new tile
-                    tile = self.download_tile(x, y, self.zoom)
-                    new_tiles[(x, y)] = tile
-                    time.sleep(0.05)  # Be nice to OSM servers
+                    missing.append((x, y))
+            
+            # Download missing tiles in parallel (worker cap throttles requests);
+            # download_tile stores them, and waits out ones the prefetcher is
+            # already fetching rather than requesting them again
+            if missing:
+                with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+                    futures = {
+                        executor.submit(self.download_tile, x, y, zoom): (x, y)
+                        for x, y in missing
+                    }
+                    for future in as_completed(futures):
+                        x, y = futures[future]
+                        if not future.result():
+                            self.store_tile((zoom, x, y),
+                                            self.create_fallback_tile(x, y), fallback=True)
+            
+            print(f"✅ Loaded {len(entering)} new tiles for display")
             
-            self.tiles = new_tiles
-            print(f"✅ Loaded {len(self.tiles)} tiles for display")
+            # Fetch the surrounding ring ahead of motion
+            self.queue_prefetch(center_x, center_y, zoom, generation)
             
         except Exception as e:
             print(f"❌ Error loading map tiles: {e}")
@@ -252,13 +683,18 @@ class GPSMapDisplay:
             if len(args) != 15:
                 return
             
+            # Unpack the gpsd fix signal in one go
+            (_, mode, _, lat, lon, h_accuracy, altitude,
+             _, _, _, speed, _, _, _, _) = args
+            
             # Parse GPS data
-            lat = float(args[3])
-            lon = float(args[4])
-            h_accuracy = float(args[5]) if not math.isnan(float(args[5])) else None
-            altitude = float(args[6]) if not math.isnan(float(args[6])) else None
-            speed = float(args[10]) if not math.isnan(float(args[10])) else None
-            mode = int(args[1])
+            lat = float(lat)
+            lon = float(lon)
+            h_accuracy = optional_float(h_accuracy)
+            altitude = optional_float(altitude)
+            speed = optional_float(speed)
+            mode = int(mode)
+            now = time.time()
             
             self.current_location = {
                 'latitude': lat,
@@ -267,115 +703,159 @@ class GPSMapDisplay:
                 'accuracy': h_accuracy,
                 'speed': speed,
                 'mode': mode,
-                'timestamp': time.time()
+                'timestamp': now
             }
             
             # Update map center to current position
-            old_center = self.map_center
             self.map_center = (lon, lat)
+            self.dirty = True
             
-            # Calculate tile coordinates
-            center_x = self.lon2tile(lon, self.zoom)
-            center_y = self.lat2tile(lat, self.zoom)
-            
-            # Check if we moved to a different tile or near edge
-            old_center_x = self.lon2tile(old_center[0], self.zoom) if old_center else None
-            old_center_y = self.lat2tile(old_center[1], self.zoom) if old_center else None
+            # Calculate tile coordinates, reading the zoom once since the
+            # main loop can change it between the lookups
+            zoom = self.zoom
+            center_x = self.lon2tile(lon, zoom)
+            center_y = self.lat2tile(lat, zoom)
             
-            if (old_center_x != center_x or old_center_y != center_y or 
-                not self.current_tile_coords):
-                self.load_map_tiles()
+            # Check if we moved to a different tile, comparing against the
+            # tile remembered from the last fix rather than re-projecting it
+            gps_tile = (center_x, center_y, zoom)
+            if gps_tile != self.gps_tile or not self.current_tile_coords:
+                self.gps_tile = gps_tile
+                self.request_map_tiles()
             
-            # Print update occasionally
-            if time.time() % 5 < 0.1:
+            # Print update every few seconds (monotonic so clock steps don't skew it)
+            log_time = time.monotonic()
+            if log_time >= self.next_gps_log_time:
+                self.next_gps_log_time = log_time + 5.0
                 print(f"📍 GPS: {lat:.6f}, {lon:.6f} - Tile: {center_x},{center_y}")
             
         except Exception as e:
             print(f"❌ Error processing GPS: {e}")
     
-    def draw_map(self):
-        """Draw all tiles to fill the display"""
-        if not self.tiles or not self.current_tile_coords:
-            return
-            
-        center_x, center_y, zoom = self.current_tile_coords
-        lon, lat = self.map_center
+    def render_text(self, text, font, color):
+        """Render text, reusing the surface if the same text was drawn recently"""
+        key = (text, font, color)
+        surface = self.text_cache.get(key)
+        if not surface:
+            # Antialiased text has per-pixel alpha, so match it to the display format
+            surface = font.render(text, True, color).convert_alpha()
+            self.text_cache[key] = surface
+        return surface
+    
+    def get_map_offset(self, map_center, tile_coords):
+        """Get the screen position of the center tile"""
+        offset_key = (map_center, tile_coords)
+        if offset_key == self.map_offset_key:
+            return self.map_offset
         
-        # Calculate pixel position within center tile
-        pixel_x = int((lon - self.tile2lon(center_x, zoom)) * 
-                     self.tile_size / (self.tile2lon(center_x + 1, zoom) - 
-                     self.tile2lon(center_x, zoom)))
+        center_x, center_y, zoom = tile_coords
+        lon, lat = map_center
         
-        pixel_y = int((lat - self.tile2lat(center_y, zoom)) * 
-                     self.tile_size / (self.tile2lat(center_y + 1, zoom) - 
-                     self.tile2lat(center_y, zoom)))
+        # Calculate pixel position within center tile from the same projection
+        # used to pick the tile
+        pixel_x = int((self.lon2tile_frac(lon, zoom) - center_x) * self.tile_size)
+        pixel_y = int((self.lat2tile_frac(lat, zoom) - center_y) * self.tile_size)
         
         # Calculate offset to center the map on current position
-        offset_x = WIDTH // 2 - pixel_x
-        offset_y = HEIGHT // 2 - pixel_y
+        self.map_offset = (WIDTH // 2 - pixel_x, HEIGHT // 2 - pixel_y)
+        self.map_offset_key = offset_key
+        return self.map_offset
+    
+    def build_map_mosaic(self, tile_coords):
+        """Compose the 3x3 tiles around the center tile into the mosaic"""
+        center_x, center_y, zoom = tile_coords
         
-        # Draw all tiles
-        for (tile_x, tile_y), tile_surface in self.tiles.items():
-            # Calculate position of this tile
-            tile_screen_x = offset_x + (tile_x - center_x) * self.tile_size
-            tile_screen_y = offset_y + (tile_y - center_y) * self.tile_size
-            
-            # Only draw if tile is visible on screen
-            if (tile_screen_x + self.tile_size > 0 and tile_screen_x < WIDTH and
-                tile_screen_y + self.tile_size > 0 and tile_screen_y < HEIGHT):
-                self.screen.blit(tile_surface, (tile_screen_x, tile_screen_y))
+        # Look up tiles under the lock since the prefetcher may add tiles
+        with self.tiles_lock:
+            block = [(self.tiles.get((zoom, center_x + dx, center_y + dy)), dx, dy)
+                     for dx in (-1, 0, 1)
+                     for dy in (-1, 0, 1)]
+            keys = {(zoom, center_x + dx, center_y + dy) for _, dx, dy in block}
+            self.mosaic_tile_count = len((keys & self.tiles.keys()) - self.fallback_keys)
+        
+        self.map_mosaic.fill(self.colors['background'])
+        for tile_surface, dx, dy in block:
+            if tile_surface:
+                self.map_mosaic.blit(tile_surface,
+                                     ((dx + 1) * self.tile_size, (dy + 1) * self.tile_size))
+    
+    def draw_map(self):
+        """Draw the tile mosaic to fill the display"""
+        loaded_coords = self.current_tile_coords
+        if not self.tiles or not loaded_coords:
+            return
+        
+        # Center the mosaic on the tile under the current position rather than
+        # the loader's center tile, which lags behind the fixes. Otherwise the
+        # 3x3 block stops covering the screen edge once the position crosses
+        # into the next tile. Keep the loaded zoom, since that's what's cached.
+        map_center = self.map_center  # Read once, the GPS thread replaces it
+        lon, lat = map_center
+        zoom = loaded_coords[2]
+        tile_coords = (self.lon2tile(lon, zoom), self.lat2tile(lat, zoom), zoom)
+        
+        # Recompose only when the center tile changes or a tile arrives
+        if self.mosaic_stale or tile_coords != self.mosaic_coords:
+            self.mosaic_stale = False
+            self.mosaic_coords = tile_coords
+            self.build_map_mosaic(tile_coords)
+        
+        offset_x, offset_y = self.get_map_offset(map_center, tile_coords)
+        self.screen.blit(self.map_mosaic, (offset_x - self.tile_size, offset_y - self.tile_size))
     
     def draw_marker(self):
         """Draw the position marker"""
-        if self.current_location:
+        location = self.current_location  # Read once, the GPS thread replaces it
+        if location:
             # Always draw marker at center of screen
             center_x, center_y = WIDTH // 2, HEIGHT // 2
             
             # Draw accuracy circle if available
-            if self.current_location['accuracy']:
-                acc_px = min(int(self.current_location['accuracy'] * 3), 100)
+            if location['accuracy']:
+                acc_px = min(int(location['accuracy'] * 3), 100)
                 pygame.draw.circle(self.screen, (255, 0, 0, 100), 
                                  (center_x, center_y), acc_px, 1)
             
             # Draw blue marker
-            pygame.draw.circle(self.screen, self.colors['marker'], (center_x, center_y), 8)
-            pygame.draw.circle(self.screen, (255, 255, 255), (center_x, center_y), 3)
+            self.screen.blit(self.marker, (center_x - 8, center_y - 8))
     
     def draw_info_panel(self):
         """Draw the information overlay"""
-        if not self.current_location:
+        location = self.current_location  # Read once, the GPS thread replaces it
+        if not location:
             return
         
-        # Create semi-transparent background
-        panel = pygame.Surface((150, 80), pygame.SRCALPHA)
-        panel.fill((0, 0, 0, 127))
-        self.screen.blit(panel, (10, 10))
+        # Semi-transparent background, drawn with the text in one blits() call
+        blits = [(self.info_panel_bg, (10, 10))]
         
         # Display coordinates and info
-        lat = self.current_location['latitude']
-        lon = self.current_location['longitude']
-        alt = self.current_location['altitude'] or 0
-        acc = self.current_location['accuracy'] or 0
-        spd = (self.current_location['speed'] or 0) * 3.6  # Convert to km/h
+        lat = location['latitude']
+        lon = location['longitude']
+        alt = location['altitude'] or 0
+        acc = location['accuracy'] or 0
+        spd = (location['speed'] or 0) * 3.6  # Convert to km/h
         
+        # Labels never change, so render them separately from the values
         texts = [
-            f"Latitude: {lat:.6f}",
-            f"Longitude: {lon:.6f}", 
-            f"Altitude: {alt:.0f}m",
-            f"Accuracy: {acc:.0f}m",
-            f"Speed: {spd:.1f}km/h"
+            ("Latitude: ", f"{lat:.6f}"),
+            ("Longitude: ", f"{lon:.6f}"),
+            ("Altitude: ", f"{alt:.0f}m"),
+            ("Accuracy: ", f"{acc:.0f}m"),
+            ("Speed: ", f"{spd:.1f}km/h")
         ]
         
-        for i, text in enumerate(texts):
-            text_surface = self.font_small.render(text, True, self.colors['text'])
-            self.screen.blit(text_surface, (15, 15 + i * 15))
-    
-    def draw_status_bar(self):
-        """Draw status bar at bottom"""
-        status_rect = pygame.Rect(0, HEIGHT - 20, WIDTH, 20)
-        pygame.draw.rect(self.screen, (0, 0, 0, 180), status_rect)
+        for i, (label, value) in enumerate(texts):
+            label_surface = self.render_text(label, self.font_small, self.colors['text'])
+            value_surface = self.render_text(value, self.font_small, self.colors['text'])
+            blits.append((label_surface, (15, 15 + i * 15)))
+            blits.append((value_surface, (15 + label_surface.get_width(), 15 + i * 15)))
         
-        if self.current_location and self.current_location['mode'] > 0:
+        self.screen.blits(blits, doreturn=False)
+    
+    def draw_status_bar(self, only_if_changed=False):
+        """Draw status bar at bottom, returning the area drawn or None if skipped"""
+        location = self.current_location  # Read once, the GPS thread replaces it
+        if location and location['mode'] > 0:
             status_text = "GPS Locked - 3D Fix"
             status_color = self.colors['status_ok']
             time_text = time.strftime("%H:%M:%S")
@@ -384,45 +864,76 @@ class GPSMapDisplay:
             status_color = self.colors['status_warn']
             time_text = "--:--:--"
         
-        # Show tile count
-        tile_text = f"Tiles: {len(self.tiles)}"
+        # Show how many tiles on screen are loaded, rather than the cache size
+        # that the prefetcher grows in the background
+        tile_text = f"Tiles: {self.mosaic_tile_count}"
+        
+        texts = (status_text, status_color, time_text, tile_text)
+        if only_if_changed and texts == self.status_bar_texts:
+            return None
+        self.status_bar_texts = texts
         
-        status_surface = self.font_medium.render(status_text, True, status_color)
-        time_surface = self.font_small.render(time_text, True, (200, 200, 200))
-        tile_surface = self.font_small.render(tile_text, True, (200, 200, 200))
+        status_surface = self.render_text(status_text, self.font_medium, status_color)
+        time_surface = self.render_text(time_text, self.font_small, (200, 200, 200))
+        tile_surface = self.render_text(tile_text, self.font_small, (200, 200, 200))
         
-        self.screen.blit(status_surface, (10, HEIGHT - 16))
-        self.screen.blit(time_surface, (WIDTH - 80, HEIGHT - 16))
-        self.screen.blit(tile_surface, (WIDTH // 2 - 30, HEIGHT - 16))
+        status_rect = self.screen.blit(self.status_bar_bg, (0, HEIGHT - 20))
+        self.screen.blits([
+            (status_surface, (10, HEIGHT - 16)),
+            (time_surface, (WIDTH - 80, HEIGHT - 16)),
+            (tile_surface, (WIDTH // 2 - 30, HEIGHT - 16)),
+        ], doreturn=False)
+        
+        return status_rect
     
     def run(self):
         """Main display loop"""
         while self.running:
-            for event in pygame.event.get():
+            # Sleep until an event arrives or 100 ms pass, rather than ticking
+            # at a fixed frame rate; the other threads only set flags, so the
+            # timeout bounds how quickly their changes show up
+            events = [pygame.event.wait(100)] + pygame.event.get()
+            
+            old_zoom = self.zoom
+            for event in events:
                 if event.type == pygame.QUIT:
                     self.running = False
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:
                         self.running = False
                     elif event.key == pygame.K_PLUS or event.key == pygame.K_EQUALS:
-                        self.zoom = min(self.zoom + 1, 18)
-                        self.load_map_tiles()  # Reload all tiles on zoom change
+                        self.zoom = min(self.zoom + 1, MAX_ZOOM)
                     elif event.key == pygame.K_MINUS:
-                        self.zoom = max(self.zoom - 1, 2)
-                        self.load_map_tiles()  # Reload all tiles on zoom change
+                        self.zoom = max(self.zoom - 1, MIN_ZOOM)
+                elif event.type == pygame.VIDEOEXPOSE:
+                    self.dirty = True
             
-            # Clear screen
-            self.screen.fill(self.colors['background'])
+            # Reload all tiles once for the final zoom of the batch
+            if self.zoom != old_zoom:
+                self.request_map_tiles()
+                self.dirty = True
             
-            # Draw map, marker, and info
-            self.draw_map()
-            self.draw_marker()
-            self.draw_info_panel()
-            self.draw_status_bar()
-            
-            # Update display
-            pygame.display.flip()
-            self.clock.tick(10)  # 10 FPS
+            if self.dirty:
+                # Clear the flag first so changes made while drawing aren't lost
+                self.dirty = False
+                
+                # Clear screen
+                self.screen.fill(self.colors['background'])
+                
+                # Draw map, marker, and info
+                self.draw_map()
+                self.draw_marker()
+                self.draw_info_panel()
+                self.draw_status_bar()
+                
+                # Update display
+                pygame.display.flip()
+            else:
+                # Nothing moved (the map follows the marker, so any fix moves
+                # everything); only push the status bar when its text changes
+                status_rect = self.draw_status_bar(only_if_changed=True)
+                if status_rect:
+                    pygame.display.update(status_rect)
         
         pygame.quit()
 